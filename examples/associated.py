@@ -14,15 +14,16 @@ import shutil
 import modelcif.reader
 
 
-# Get any associated files containing pairwise QA scores
+# Get any zip archives containing associated files with pairwise QA scores,
+# grouped by archive so that each archive need only be downloaded once
 def _get_zip_scores_files(s):
     for repo in s.repositories:
         for f in repo.files:
             if isinstance(f, modelcif.associated.ZipFile):
-                for zf in f.files:
-                    if isinstance(
-                            zf, modelcif.associated.QAMetricsFile):
-                        yield zf, f, repo
+                scores = [zf for zf in f.files
+                          if isinstance(zf, modelcif.associated.QAMetricsFile)]
+                if scores:
+                    yield scores, f, repo
 
 
 # Download entry ma-bak-cepc-0944 directly from ModelArchive
@@ -33,17 +34,18 @@ with urllib.request.urlopen(url) as fh:
 
 # Get any referenced associated files containing QA scores. For ModelArchive,
 # these are stored in an mmCIF file that is then compressed into a zip file
-for scores, archive, repo in _get_zip_scores_files(s):
+for all_scores, archive, repo in _get_zip_scores_files(s):
     url = repo.get_url(archive)
     # Download the referenced zip file directly from ModelArchive
-    with urllib.request.urlopen(repo.get_url(archive)) as f_url:
+    with urllib.request.urlopen(url) as f_url:
         with tempfile.NamedTemporaryFile() as f_zip:
             shutil.copyfileobj(f_url, f_zip)
-            # Extract the scores file from the zip file
+            # Extract each scores file from the zip file
             with zipfile.ZipFile(f_zip) as zf:
-                with zf.open(scores.path) as f_scores:
-                    # Add scores in the file to our existing System
-                    modelcif.reader.read(f_scores, add_to_system=s)
+                for scores in all_scores:
+                    with zf.open(scores.path) as f_scores:
+                        # Add scores in the file to our existing System
+                        modelcif.reader.read(f_scores, add_to_system=s)
 
 for mg in s.model_groups:
     for m in mg:
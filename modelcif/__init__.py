@@ -1,4 +1,5 @@
 import itertools
+import operator
 import warnings
 import ihm
 from ihm import Entity, AsymUnit, Software, Assembly, Residue  # noqa: F401
@@ -9,6 +10,22 @@ import sys
 __version__ = '1.3'
 
 
+def _get_chem_comps(entities):
+    """Return a frozenset of all ChemComps used in the given entities"""
+    # Sequences built from an alphabet share the same ChemComp objects, so
+    # first discard identical objects using only their id (cheap), so that
+    # the more expensive ChemComp hash is computed once per unique object
+    # rather than once per residue
+    comps = {id(comp): comp for e in entities for comp in e.sequence}
+    return frozenset(comps.values())
+
+
+def _get_canonical_sequence(entity):
+    """Return the canonical one-letter sequence of `entity` as a string"""
+    # str.join is faster given a list than a generator
+    return "".join([comp.code_canonical for comp in entity.sequence])
+
+
 class System(object):
     """Top-level class representing a complete modeled system.
 
@@ -90,18 +107,48 @@ class System(object):
         # Mapping from ID to QA metric classes
         self._qa_by_id = {}
 
+        # Cached results of some _all_* methods, or None if caching is
+        # disabled (see _cached)
+        self._cache = None
+
+    def _cached(self, name, func):
+        """Return an iterator over the results of `func`.
+           While writing (between _before_write and the next call to
+           _invalidate_cache) the results are computed only once and then
+           reused, since the dumpers traverse the system many times but
+           do not modify it."""
+        if self._cache is None:
+            return func()
+        r = self._cache.get(name)
+        if r is None:
+            r = self._cache[name] = list(func())
+        return iter(r)
+
+    def _invalidate_cache(self):
+        """Discard any cached results, and disable further caching.
+           This is called automatically once the system has been written
+           out (by the last dumper in :class:`modelcif.dumper.ModelCIFVariant`
+           and by :func:`modelcif.dumper.write`) and when reading into
+           an existing system."""
+        self._cache = None
+
     def _all_models(self):
         """Iterate over all Models in the system"""
+        return self._cached('models', self._get_all_models)
+
+    def _get_all_models(self):
         # todo: raise an error if a model is present in multiple groups?
         seen_models = set()
         for group in self._all_model_groups():
             for model in group:
-                if model in seen_models:
-                    continue
-                seen_models.add(model)
-                yield group, model
+                if id(model) not in seen_models:
+                    seen_models.add(id(model))
+                    yield group, model
 
     def _before_write(self):
+        # Throw away anything cached by a previous write, then cache the
+        # results of the traversals used repeatedly by the dumpers
+        self._cache = {}
         # Populate flat lists to contain all referenced objects only once
         # We must populate these in the correct order to get all objects
         self.assemblies = list(_remove_identical(self._all_assemblies()))
@@ -127,10 +174,13 @@ class System(object):
     def _add_missing_reference_sequence(self):
         """If any TargetReference has no sequence, use that of the Entity"""
         for e in self.entities:
+            canon = None
             for r in e.references:
                 if r.sequence is None:
-                    r.sequence = "".join(comp.code_canonical
-                                         for comp in e.sequence)
+                    # Build the sequence only once per entity
+                    if canon is None:
+                        canon = _get_canonical_sequence(e)
+                    r.sequence = canon
 
     def _check_after_write(self):
         pass
@@ -184,38 +234,40 @@ class System(object):
                         else:
                             yield s
 
-        def _all_entities():
-            return itertools.chain(
-                self.entities, (t.entity for t in self.templates))
-
-        def _all_descriptor_software():
-            comps = frozenset(comp for e in _all_entities()
-                              for comp in e.sequence)
-            for comp in comps:
-                if hasattr(comp, 'descriptors') and comp.descriptors:
-                    for desc in comp.descriptors:
-                        if desc.software:
-                            yield desc.software
-        return (itertools.chain(
-            self.software, _all_software_in_groups(),
-            _all_descriptor_software()))
+        descriptor_software = (
+            desc.software for comp in self._all_chem_comps()
+            for desc in getattr(comp, 'descriptors', None) or ()
+            if desc.software)
+        return itertools.chain(
+            self.software, _all_software_in_groups(), descriptor_software)
+
+    def _all_chem_comps(self):
+        """Iterate over all unique ChemComps used by target or template
+           entities, sorted by ID"""
+        return self._cached('chem_comps', self._get_all_chem_comps)
+
+    def _get_all_chem_comps(self):
+        # Template entities are not in self.entities, so add them here
+        entities = itertools.chain(
+            self.entities, (t.entity for t in self.templates))
+        return sorted(_get_chem_comps(entities),
+                      key=operator.attrgetter('id'))
 
     def _all_assemblies(self):
         """Iterate over all Assemblies in the system.
            This includes all Assemblies referenced from other objects, plus
            any orphaned Assemblies. Duplicates may be present."""
-        return itertools.chain(
-            self.assemblies,
-            (model.assembly for group, model in self._all_models()
-             if model.assembly))
+        out = list(self.assemblies)
+        for group, model in self._all_models():
+            if model.assembly:
+                out.append(model.assembly)
+        return out
 
     def _all_asym_units(self):
-        def _all_asym_in_assemblies():
-            for asmb in self.assemblies:
-                for a in asmb:
-                    yield a.asym if hasattr(a, 'asym') else a
+        # Assemblies may contain AsymUnitRange objects; map them to AsymUnit
         return itertools.chain(
-            self.asym_units, _all_asym_in_assemblies())
+            self.asym_units,
+            (getattr(a, 'asym', a) for asmb in self.assemblies for a in asmb))
 
     def _all_entities(self):
         return itertools.chain(
@@ -225,6 +277,15 @@ class System(object):
     def _all_model_groups(self, only_in_states=True):
         return self.model_groups
 
+    def _all_repo_files(self):
+        """Iterate over all files in all repositories, including
+           files contained in archives"""
+        for repo in self.repositories:
+            for f in repo.files:
+                yield f
+                for subf in getattr(f, 'files', ()):
+                    yield subf
+
     def _all_data(self):
         def _all_data_in_groups():
             for dg in self.data_groups:
@@ -232,15 +293,6 @@ class System(object):
                     for data in dg:
                         yield data
 
-        def _all_data_in_files():
-            for repo in self.repositories:
-                for f in repo.files:
-                    if f.data:
-                        yield f.data
-                    if hasattr(f, 'files'):
-                        for subf in f.files:
-                            if subf.data:
-                                yield subf.data
         return itertools.chain(
             self.data,
             self.templates,
@@ -248,29 +300,37 @@ class System(object):
             self.alignments,
             (model for group, model in self._all_models()),
             _all_data_in_groups(),
-            _all_data_in_files())
+            (f.data for f in self._all_repo_files() if f.data))
 
     def _all_data_groups(self):
         """Return all DataGroup (or singleton Data) objects"""
-        return itertools.chain(
-            self.data_groups,
-            (step.input_data for p in self.protocols for step in p.steps
-             if step.input_data),
-            (step.output_data for p in self.protocols for step in p.steps
-             if step.output_data))
+        steps = [step for p in self.protocols for step in p.steps]
+        out = list(self.data_groups)
+        out.extend(step.input_data for step in steps if step.input_data)
+        out.extend(step.output_data for step in steps if step.output_data)
+        return out
 
     def _all_software_groups(self):
         """Return all SoftwareGroup (or singleton Software) objects"""
-        return itertools.chain(
-            self.software_groups,
-            (aln.software for aln in self.alignments if aln.software),
-            (step.software for p in self.protocols for step in p.steps
-             if step.software),
-            (metric.software for group, model in self._all_models()
-             for metric in model.qa_metrics if metric.software))
+        out = list(self.software_groups)
+        for aln in self.alignments:
+            if aln.software:
+                out.append(aln.software)
+        for p in self.protocols:
+            for step in p.steps:
+                if step.software:
+                    out.append(step.software)
+        for group, model in self._all_models():
+            for metric in model.qa_metrics:
+                if metric.software:
+                    out.append(metric.software)
+        return out
 
     def _all_features(self):
         """Return all Feature objects"""
+        return self._cached('features', self._get_all_features)
+
+    def _get_all_features(self):
         for _, model in self._all_models():
             for m in model.qa_metrics:
                 if hasattr(m, '_all_features'):
@@ -497,6 +557,8 @@ class _TemplateBase(modelcif.data.Data):
         self.transformation = transformation
         self._strand_id = strand_id
         self.entity_id = entity_id
+        # Mapping from segment parameters to TemplateSegment objects
+        self._segments = {}
 
     def segment(self, gapped_sequence, seq_id_begin, seq_id_end):
         """Get an object representing the alignment of part of this sequence.
@@ -504,9 +566,20 @@ class _TemplateBase(modelcif.data.Data):
            :param str gapped_sequence: Sequence of the segment, including gaps.
            :param int seq_id_begin: Start of the segment.
            :param int seq_id_end: End of the segment.
+
+           The same object is returned if this method is called more than
+           once with the same parameters. It is thus shared by every
+           alignment that uses it, and so is written to the file only once
+           (a single ``_ma_template_poly_segment`` row). Callers must not
+           modify the returned object; create a new
+           :class:`TemplateSegment` instead if a modified segment is needed.
         """
-        # todo: cache so we return the same object for same parameters
-        return TemplateSegment(self, gapped_sequence, seq_id_begin, seq_id_end)
+        key = (gapped_sequence, seq_id_begin, seq_id_end)
+        seg = self._segments.get(key)
+        if seg is None:
+            seg = self._segments[key] = TemplateSegment(
+                self, gapped_sequence, seq_id_begin, seq_id_end)
+        return seg
 
     seq_id_range = property(lambda self: self.entity.seq_id_range,
                             doc="Sequence range")
@@ -35,7 +35,7 @@ class Identity(object):
     def _get_other_details(self):
         if (type(self) is not Identity
                 and self.denominator == Identity.denominator):
-            return self.__doc__.split('\n')[0]
+            return self.__doc__.split('\n', 1)[0]
 
     other_details = property(
         _get_other_details,
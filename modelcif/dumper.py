@@ -2,7 +2,6 @@
 
 from datetime import date
 import itertools
-import operator
 import ihm.dumper
 import ihm
 from ihm import util
@@ -42,14 +41,10 @@ class _DatabaseDumper(Dumper):
 class _ChemCompDumper(Dumper):
     # Similar to ihm.dumper._ChemCompDumper, but we need to also include
     # components referenced only by Templates, as their Entities are not
-    # included in system.entities by default
+    # included in system.entities by default (see System._all_chem_comps)
 
     _prov_map = {'core': 'CCD Core', 'ma': 'CCD MA', 'local': 'CCD local'}
 
-    def _get_entities(self, system):
-        return itertools.chain(
-            system.entities, (t.entity for t in system.templates))
-
     def _get_provenance(self, comp):
         ccd = comp.ccd
         if ccd is None:
@@ -66,13 +61,10 @@ class _ChemCompDumper(Dumper):
         return val
 
     def dump(self, system, writer):
-        comps = frozenset(
-            comp for e in self._get_entities(system) for comp in e.sequence)
-
         with writer.loop("_chem_comp", ["id", "type", "name",
                                         "formula", "formula_weight",
                                         "ma_provenance"]) as lp:
-            for comp in sorted(comps, key=operator.attrgetter('id')):
+            for comp in system._all_chem_comps():
                 lp.write(id=comp.id, type=comp.type, name=comp.name,
                          formula=comp.formula,
                          formula_weight=comp.formula_weight,
@@ -80,22 +72,16 @@ class _ChemCompDumper(Dumper):
 
 
 class _ChemCompDescriptorDumper(Dumper):
-    def _get_entities(self, system):
-        return itertools.chain(
-            system.entities, (t.entity for t in system.templates))
-
     def dump(self, system, writer):
         ordinal = itertools.count(1)
-        comps = frozenset(
-            comp for e in self._get_entities(system) for comp in e.sequence)
-
         with writer.loop("_ma_chem_comp_descriptor",
                          ["ordinal_id", "chem_comp_id", "chem_comp_name",
                           "type", "value", "details", "software_id"]) as lp:
-            for comp in sorted(comps, key=operator.attrgetter('id')):
-                if not hasattr(comp, 'descriptors') or not comp.descriptors:
+            for comp in system._all_chem_comps():
+                descriptors = getattr(comp, 'descriptors', None)
+                if not descriptors:
                     continue
-                for desc in comp.descriptors:
+                for desc in descriptors:
                     lp.write(ordinal_id=next(ordinal), chem_comp_id=comp.id,
                              chem_comp_name=comp.name, type=desc.type,
                              value=desc.value, details=desc.details,
@@ -648,8 +634,7 @@ class _ModelDumper(ihm.dumper._ModelDumperBase):
             for group in system.model_groups:
                 # ihm.model.ModelGroup only supports details after v1.8
                 lp.write(id=group._id, name=group.name,
-                         details=group.details
-                         if hasattr(group, 'details') else None)
+                         details=getattr(group, 'details', None))
 
     def dump_model_group_link(self, system, writer):
         with writer.loop("_ma_model_group_link",
@@ -697,9 +682,7 @@ class _AssociatedDumper(Dumper):
                  "file_content", "description", "data_id"]) as lp:
             for repo in system.repositories:
                 for f in repo.files:
-                    if not hasattr(f, 'files'):
-                        continue
-                    for af in f.files:
+                    for af in getattr(f, 'files', ()):
                         lp.write(id=af._id, archive_file_id=f._id,
                                  file_path=af.path, file_format=af.file_format,
                                  file_content=af.file_content,
@@ -771,20 +754,32 @@ class _FeatureDumper(Dumper):
 
 
 class _QAMetricDumper(Dumper):
+    _modes = (modelcif.qa_metric.Global, modelcif.qa_metric.Local,
+              modelcif.qa_metric.LocalPairwise, modelcif.qa_metric.Feature,
+              modelcif.qa_metric.FeaturePairwise)
+
     def finalize(self, system):
-        # Get all metric classes used by all systems
-        seen_metric_classes = set()
+        # Get all metric classes used by all systems, and sort all metrics
+        # by mode, in a single pass over all models
         self._metric_classes_by_id = []
+        self._metrics_by_mode = {mode: [] for mode in self._modes}
+        # Mapping from metric class to the per-mode lists it belongs in
+        lists_for_class = {}
         metric_id = itertools.count(1)
         for group, model in system._all_models():
             for m in model.qa_metrics:
                 cls = type(m)
-                if cls not in seen_metric_classes:
-                    seen_metric_classes.add(cls)
+                lists = lists_for_class.get(cls)
+                if lists is None:
                     cls._id = next(metric_id)
                     # We need an instance of the class in case name or
                     # description are provided by property()
                     self._metric_classes_by_id.append(m)
+                    lists = lists_for_class[cls] = [
+                        self._metrics_by_mode[mode] for mode in self._modes
+                        if issubclass(cls, mode)]
+                for lst in lists:
+                    lst.append((model, m))
 
     def dump(self, system, writer):
         self.dump_metric_types(system, writer)
@@ -811,12 +806,9 @@ class _QAMetricDumper(Dumper):
         with writer.loop(
                 "_ma_qa_metric_global",
                 ["ordinal_id", "model_id", "metric_id", "metric_value"]) as lp:
-            for group, model in system._all_models():
-                for m in model.qa_metrics:
-                    if not isinstance(m, modelcif.qa_metric.Global):
-                        continue
-                    lp.write(ordinal_id=next(ordinal), model_id=model._id,
-                             metric_id=m._id, metric_value=m.value)
+            for model, m in self._metrics_by_mode[modelcif.qa_metric.Global]:
+                lp.write(ordinal_id=next(ordinal), model_id=model._id,
+                         metric_id=m._id, metric_value=m.value)
 
     def dump_metric_local(self, system, writer):
         ordinal = itertools.count(1)
@@ -824,16 +816,13 @@ class _QAMetricDumper(Dumper):
                 "_ma_qa_metric_local",
                 ["ordinal_id", "model_id", "label_asym_id", "label_seq_id",
                  "label_comp_id", "metric_id", "metric_value"]) as lp:
-            for group, model in system._all_models():
-                for m in model.qa_metrics:
-                    if not isinstance(m, modelcif.qa_metric.Local):
-                        continue
-                    seq = m.residue.asym.entity.sequence
-                    lp.write(ordinal_id=next(ordinal), model_id=model._id,
-                             label_asym_id=m.residue.asym._id,
-                             label_seq_id=m.residue.seq_id,
-                             label_comp_id=seq[m.residue.seq_id - 1].id,
-                             metric_id=m._id, metric_value=m.value)
+            for model, m in self._metrics_by_mode[modelcif.qa_metric.Local]:
+                res = m.residue
+                asym = res.asym
+                lp.write(ordinal_id=next(ordinal), model_id=model._id,
+                         label_asym_id=asym._id, label_seq_id=res.seq_id,
+                         label_comp_id=asym.entity.sequence[res.seq_id - 1].id,
+                         metric_id=m._id, metric_value=m.value)
 
     def dump_metric_pairwise(self, system, writer):
         ordinal = itertools.count(1)
@@ -842,20 +831,20 @@ class _QAMetricDumper(Dumper):
                 ["ordinal_id", "model_id", "label_asym_id_1", "label_seq_id_1",
                  "label_comp_id_1", "label_asym_id_2", "label_seq_id_2",
                  "label_comp_id_2", "metric_id", "metric_value"]) as lp:
-            for group, model in system._all_models():
-                for m in model.qa_metrics:
-                    if not isinstance(m, modelcif.qa_metric.LocalPairwise):
-                        continue
-                    seq1 = m.residue1.asym.entity.sequence
-                    seq2 = m.residue2.asym.entity.sequence
-                    lp.write(ordinal_id=next(ordinal), model_id=model._id,
-                             label_asym_id_1=m.residue1.asym._id,
-                             label_seq_id_1=m.residue1.seq_id,
-                             label_comp_id_1=seq1[m.residue1.seq_id - 1].id,
-                             label_asym_id_2=m.residue2.asym._id,
-                             label_seq_id_2=m.residue2.seq_id,
-                             label_comp_id_2=seq2[m.residue2.seq_id - 1].id,
-                             metric_id=m._id, metric_value=m.value)
+            for model, m in self._metrics_by_mode[
+                    modelcif.qa_metric.LocalPairwise]:
+                res1, res2 = m.residue1, m.residue2
+                asym1, asym2 = res1.asym, res2.asym
+                lp.write(ordinal_id=next(ordinal), model_id=model._id,
+                         label_asym_id_1=asym1._id,
+                         label_seq_id_1=res1.seq_id,
+                         label_comp_id_1=asym1.entity.sequence[
+                             res1.seq_id - 1].id,
+                         label_asym_id_2=asym2._id,
+                         label_seq_id_2=res2.seq_id,
+                         label_comp_id_2=asym2.entity.sequence[
+                             res2.seq_id - 1].id,
+                         metric_id=m._id, metric_value=m.value)
 
     def dump_metric_feature(self, system, writer):
         ordinal = itertools.count(1)
@@ -863,13 +852,10 @@ class _QAMetricDumper(Dumper):
                 "_ma_qa_metric_feature",
                 ["ordinal_id", "model_id", "feature_id", "metric_id",
                  "metric_value"]) as lp:
-            for group, model in system._all_models():
-                for m in model.qa_metrics:
-                    if not isinstance(m, modelcif.qa_metric.Feature):
-                        continue
-                    lp.write(ordinal_id=next(ordinal), model_id=model._id,
-                             feature_id=m.feature._id,
-                             metric_id=m._id, metric_value=m.value)
+            for model, m in self._metrics_by_mode[modelcif.qa_metric.Feature]:
+                lp.write(ordinal_id=next(ordinal), model_id=model._id,
+                         feature_id=m.feature._id,
+                         metric_id=m._id, metric_value=m.value)
 
     def dump_metric_feature_pairwise(self, system, writer):
         ordinal = itertools.count(1)
@@ -877,14 +863,19 @@ class _QAMetricDumper(Dumper):
                 "_ma_qa_metric_feature_pairwise",
                 ["ordinal_id", "model_id", "feature_id_1", "feature_id_2",
                  "metric_id", "metric_value"]) as lp:
-            for group, model in system._all_models():
-                for m in model.qa_metrics:
-                    if not isinstance(m, modelcif.qa_metric.FeaturePairwise):
-                        continue
-                    lp.write(ordinal_id=next(ordinal), model_id=model._id,
-                             feature_id_1=m.feature1._id,
-                             feature_id_2=m.feature2._id,
-                             metric_id=m._id, metric_value=m.value)
+            for model, m in self._metrics_by_mode[
+                    modelcif.qa_metric.FeaturePairwise]:
+                lp.write(ordinal_id=next(ordinal), model_id=model._id,
+                         feature_id_1=m.feature1._id,
+                         feature_id_2=m.feature2._id,
+                         metric_id=m._id, metric_value=m.value)
+
+
+class _InvalidateCacheDumper(Dumper):
+    """Discard data cached by the System while it was being written.
+       This is run after all other ModelCIFVariant dumpers."""
+    def dump(self, system, writer):
+        system._invalidate_cache()
 
 
 class _CopyWriter(object):
@@ -975,7 +966,8 @@ class ModelCIFVariant(Variant):
         _QAMetricDumper]
 
     def get_dumpers(self):
-        return [d() for d in self._dumpers]
+        # Always discard the System cache after the last of our dumpers
+        return [d() for d in self._dumpers] + [_InvalidateCacheDumper()]
 
     def get_system_writer(self, system, writer_class, writer):
         # Get a Writer-like object which outputs selected categories to
@@ -983,36 +975,30 @@ class ModelCIFVariant(Variant):
         category_map = {}
         copy_category_map = {}
 
-        def _all_repo_files(r):
-            for f in r.files:
-                yield f
-                if hasattr(f, 'files'):
-                    for subf in f.files:
-                        yield subf
-        for r in system.repositories:
-            for f in _all_repo_files(r):
-                if (not hasattr(f, 'categories')
-                        or (not f.categories and not f.copy_categories)):
-                    continue
-                if f.binary:
-                    w = ihm.format_bcif.BinaryCifWriter(
-                        open(f.local_path, 'wb'))
-                else:
-                    w = ihm.format.CifWriter(open(f.local_path, 'w'))
-                # Write header information to the associated file
-                dumpers = (ihm.dumper._EntryDumper(), _EntryLinkDumper())
-                # We are passing the File object to the dumpers here where
-                # they expect a System object, but the interfaces are similar
-                # enough, so we don't need a facade object.
-                for d in dumpers:
-                    d.finalize(f)
-                for d in dumpers:
-                    d.dump(f, w)
-                for c in f.categories:
-                    # Allow for categories with or without leading underscore
-                    category_map['_' + c.lstrip('_').lower()] = w
-                for c in f.copy_categories:
-                    copy_category_map['_' + c.lstrip('_').lower()] = w
+        # The same File may be referenced more than once (e.g. if it is
+        # in several repositories); only open and write its header once
+        for f in modelcif._remove_identical(system._all_repo_files()):
+            if (not hasattr(f, 'categories')
+                    or (not f.categories and not f.copy_categories)):
+                continue
+            if f.binary:
+                w = ihm.format_bcif.BinaryCifWriter(open(f.local_path, 'wb'))
+            else:
+                w = ihm.format.CifWriter(open(f.local_path, 'w'))
+            # Write header information to the associated file
+            dumpers = (ihm.dumper._EntryDumper(), _EntryLinkDumper())
+            # We are passing the File object to the dumpers here where
+            # they expect a System object, but the interfaces are similar
+            # enough, so we don't need a facade object.
+            for d in dumpers:
+                d.finalize(f)
+            for d in dumpers:
+                d.dump(f, w)
+            for c in f.categories:
+                # Allow for categories with or without leading underscore
+                category_map['_' + c.lstrip('_').lower()] = w
+            for c in f.copy_categories:
+                copy_category_map['_' + c.lstrip('_').lower()] = w
         if category_map or copy_category_map:
             return _SystemWriter(writer, category_map, copy_category_map)
         else:
@@ -1027,4 +1013,14 @@ def write(fh, systems, format='mmCIF', dumpers=[],
        See :func:`ihm.dumper.write` for more information. The function
        here behaves similarly but writes out files compliant with the
        ModelCIF extension directory rather than IHM."""
-    return ihm.dumper.write(fh, systems, format, dumpers, variant, check=check)
+    # systems may be a generator, but we need to iterate over it again
+    systems = list(systems)
+    try:
+        return ihm.dumper.write(fh, systems, format, dumpers, variant,
+                                check=check)
+    finally:
+        # Caching is only valid while writing, as the systems may be
+        # modified afterwards (ModelCIFVariant also does this, but not if
+        # an error occurs partway through the write)
+        for system in systems:
+            system._invalidate_cache()
@@ -76,7 +76,7 @@ class Model(modelcif.data.Data):
     def _get_other_details(self):
         if (type(self) is not Model
                 and self.model_type == Model.model_type):
-            return self.__doc__.split('\n')[0]
+            return self.__doc__.split('\n', 1)[0]
 
     other_details = property(
         _get_other_details,
@@ -19,6 +19,12 @@
 
    QA metric objects should be added to
    :attr:`modelcif.model.Model.qa_metrics`.
+
+   The base classes use ``__slots__`` to reduce memory usage, as a model may
+   have a very large number of local or pairwise scores. To get the same
+   benefit for a custom score class, add ``__slots__ = []`` to its body.
+   Attributes such as ``software`` can still be set on individual metric
+   objects if desired.
 """
 
 
@@ -28,12 +34,16 @@ class MetricMode(object):
        :class:`LocalPairwise`, :class:`Feature`, or :class:`FeaturePairwise`
        for declaring a new score.
     """
+    # Keep a __dict__ so that arbitrary attributes (e.g. software) can still
+    # be set on individual metric objects; it is only allocated if used
+    __slots__ = ['__dict__']
+
     name = property(lambda x: type(x).__name__,
                     doc="Short name of this score. By default it is just the "
                         "class name, but this can be overridden in subclasses "
                         "(for example to create names containing spaces).")
 
-    description = property(lambda x: x.__doc__.split("\n")[0],
+    description = property(lambda x: x.__doc__.split("\n", 1)[0],
                            doc="Longer text description of this score. By "
                                "default it is the first line of the "
                                "docstring.")
@@ -45,6 +55,8 @@ class Global(MetricMode):
        :param float value: The score value (see :class:`MetricType`).
     """
 
+    __slots__ = ['value']
+
     mode = "global"
 
     def __init__(self, value):
@@ -62,6 +74,8 @@ class Local(MetricMode):
        :param float value: The score value (see :class:`MetricType`).
     """
 
+    __slots__ = ['residue', 'value']
+
     mode = "local"
 
     def __init__(self, residue, value):
@@ -83,6 +97,8 @@ class LocalPairwise(MetricMode):
        :param float value: The score value (see :class:`MetricType`).
     """
 
+    __slots__ = ['residue1', 'residue2', 'value']
+
     mode = "local-pairwise"
 
     def __init__(self, residue1, residue2, value):
@@ -104,6 +120,8 @@ class Feature(MetricMode):
        :param float value: The score value (see :class:`MetricType`).
     """
 
+    __slots__ = ['feature', 'value']
+
     mode = "per-feature"
 
     def __init__(self, feature, value):
@@ -126,6 +144,8 @@ class FeaturePairwise(MetricMode):
        :param float value: The score value (see :class:`MetricType`).
     """
 
+    __slots__ = ['feature1', 'feature2', 'value']
+
     mode = "per-feature-pair"
 
     def __init__(self, feature1, feature2, value):
@@ -150,6 +170,7 @@ class MetricType(object):
            class MPQSMetricType(modelcif.qa_metric.MetricType):
                 "composite score, values >1.1 are reliable"
     """
+    __slots__ = []
 
     type = "other"
 
@@ -161,7 +182,7 @@ class MetricType(object):
                 if (issubclass(base, MetricType)
                         and base is not MetricType
                         and not issubclass(base, MetricMode)):
-                    return base.__doc__.split('\n')[0]
+                    return base.__doc__.split('\n', 1)[0]
 
     other_details = property(
         _get_other_details,
@@ -172,6 +193,7 @@ class MetricType(object):
 class ZScore(MetricType):
     """Score that is the number of standard deviations from optimal/best.
        See :class:`MetricType` for more information."""
+    __slots__ = []
     type = "zscore"
     other_details = None
 
@@ -179,6 +201,7 @@ class ZScore(MetricType):
 class Energy(MetricType):
     """Energy score (the lower the energy, the better the quality).
        See :class:`MetricType` for more information."""
+    __slots__ = []
     type = "energy"
     other_details = None
 
@@ -186,6 +209,7 @@ class Energy(MetricType):
 class Distance(MetricType):
     """Distance score (the lower the distance, the better the quality).
        See :class:`MetricType` for more information."""
+    __slots__ = []
     type = "distance"
     other_details = None
 
@@ -193,6 +217,7 @@ class Distance(MetricType):
 class NormalizedScore(MetricType):
     """Normalized score ranging from 0 to 1.
        See :class:`MetricType` for more information."""
+    __slots__ = []
     type = "normalized score"
     other_details = None
 
@@ -200,6 +225,7 @@ class NormalizedScore(MetricType):
 class PAE(MetricType):
     """Score that is a predicted aligned error.
        See :class:`MetricType` for more information."""
+    __slots__ = []
     type = "PAE"
     other_details = None
 
@@ -207,6 +233,7 @@ class PAE(MetricType):
 class ContactProbability(MetricType):
     """Score that is a contact probability of a pairwise interaction.
        See :class:`MetricType` for more information."""
+    __slots__ = []
     type = "contact probability"
     other_details = None
 
@@ -214,6 +241,7 @@ class ContactProbability(MetricType):
 class PLDDT(MetricType):
     """Predicted lDDT-CA score in [0,100] (higher score, means better
        accuracy). See :class:`MetricType` for more information."""
+    __slots__ = []
     type = "pLDDT"
     other_details = None
 
@@ -221,6 +249,7 @@ class PLDDT(MetricType):
 class PTM(MetricType):
     """Predicted TM-score in [0,1] (higher value means higher confidence).
     See :class:`MetricType` for more information."""
+    __slots__ = []
     type = "pTM"
     other_details = None
 
@@ -228,5 +257,6 @@ class PTM(MetricType):
 class IpTM(MetricType):
     """Protein-protein interface score, based on TM-score in [0,1].
     See :class:`MetricType` for more information."""
+    __slots__ = []
     type = "ipTM"
     other_details = None
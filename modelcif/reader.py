@@ -31,6 +31,18 @@ def _get_date(iso_date_str):
                 int(iso_date_str[8:10]))
 
 
+def _get_subclass_map(module, base_class, attr, key=str.upper,
+                      include_base=False):
+    """Map the given attribute of each subclass of `base_class` in `module`
+       (converted using `key`, by default to upper case) to the class.
+       These maps only depend on the classes themselves, so they are built
+       once, when this module is imported, rather than by every reader."""
+    return {key(getattr(x[1], attr)): x[1]
+            for x in inspect.getmembers(module, inspect.isclass)
+            if issubclass(x[1], base_class)
+            and (include_base or x[1] is not base_class)}
+
+
 class _AuditConformHandler(Handler):
     category = '_audit_conform'
 
@@ -144,9 +156,11 @@ class _SystemReader(object):
             *(None,) * 4)
 
         self.default_model_class = model_class is modelcif.model.Model
-        self._all_seen_models = []
-        for group, model in self.system._all_models():
-            self._all_seen_models.append(model)
+        # We are about to add to the system, so anything cached
+        # by a previous write is no longer valid
+        self.system._invalidate_cache()
+        self._all_seen_models = [model for group, model
+                                 in self.system._all_models()]
         self.models = IDMapper(self._all_seen_models, model_class, [], None)
 
         self.model_groups = IDMapper(self.system.model_groups,
@@ -180,6 +194,21 @@ class _SystemReader(object):
         # Mapping from Entity to bool ma_model_mode flag
         self.ma_model_mode_map = {}
 
+        # Mapping from (asym ID, seq_id) to shared ihm.Residue objects
+        self._residues = {}
+
+    def get_residue(self, asym_id, seq_id):
+        """Get the :class:`ihm.Residue` for the given asym ID and seq_id.
+           Residues are immutable, so the same object is returned for
+           repeated calls (local QA metric tables in particular can refer
+           to the same residue very many times)."""
+        key = (asym_id, seq_id)
+        residue = self._residues.get(key)
+        if residue is None:
+            asym = self.asym_units.get_by_id(asym_id)
+            residue = self._residues[key] = asym.residue(seq_id)
+        return residue
+
     def finalize(self):
         # make sequence immutable (see also _make_new_entity)
         for e in self.system.entities:
@@ -190,7 +219,7 @@ class _SystemReader(object):
         for mg in self.system.model_groups:
             for m in mg:
                 if not m.assembly:
-                    m.assembly.extend(self.system.asym_units[:])
+                    m.assembly.extend(self.system.asym_units)
                 m.representation = ihm.representation.Representation(
                     [ihm.representation.AtomicSegment(seg, rigid=False)
                      for seg in m.assembly])
@@ -211,18 +240,20 @@ class _ChemCompHandler(Handler):
 
     _prov_map = {'ccd core': 'core', 'ccd ma': 'ma', 'ccd local': 'local'}
 
-    def __init__(self, *args):
-        super(_ChemCompHandler, self).__init__(*args)
-        # Map _chem_comp.type to corresponding subclass of ihm.ChemComp
-        self.type_map = dict((x[1].type.lower(), x[1])
-                             for x in inspect.getmembers(ihm, inspect.isclass)
-                             if issubclass(x[1], ihm.ChemComp))
+    # Map _chem_comp.type to corresponding subclass of ihm.ChemComp
+    type_map = _get_subclass_map(ihm, ihm.ChemComp, 'type', key=str.lower,
+                                 include_base=True)
 
     def __call__(self, type, id, name, formula, ma_provenance):
         typ = 'other' if type is None else type.lower()
         s = self.sysr.chem_comps.get_by_id(
             id, self.type_map.get(typ, ihm.ChemComp))
-        self.copy_if_present(s, locals(), keys=('name', 'formula'))
+        # Set attributes directly rather than via copy_if_present(locals())
+        # to avoid building a dict of all locals for every row
+        if name is not None:
+            s.name = name
+        if formula is not None:
+            s.formula = formula
         if ma_provenance:
             s.ccd = self._prov_map.get(ma_provenance.lower())
 
@@ -230,15 +261,11 @@ class _ChemCompHandler(Handler):
 class _ChemCompDescriptorHandler(Handler):
     category = '_ma_chem_comp_descriptor'
 
-    def __init__(self, *args):
-        super(_ChemCompDescriptorHandler, self).__init__(*args)
-        # Map _chem_comp_descriptor.type to corresponding subclass of
-        # modelcif.descriptor.Descriptor
-        self._type_map = dict(
-            (x[1].type.lower(), x[1])
-            for x in inspect.getmembers(modelcif.descriptor, inspect.isclass)
-            if issubclass(x[1], modelcif.descriptor.Descriptor)
-            and x[1] is not modelcif.descriptor.Descriptor)
+    # Map _chem_comp_descriptor.type to corresponding subclass of
+    # modelcif.descriptor.Descriptor
+    _type_map = _get_subclass_map(modelcif.descriptor,
+                                  modelcif.descriptor.Descriptor, 'type',
+                                  key=str.lower)
 
     def __call__(self, chem_comp_id, type, value, details, software_id):
         s = self.sysr.chem_comps.get_by_id(chem_comp_id)
@@ -246,7 +273,7 @@ class _ChemCompDescriptorHandler(Handler):
             type.lower(), modelcif.descriptor.Descriptor)
         software = self.sysr.software.get_by_id_or_none(software_id)
         desc = type_class(value=value, details=details, software=software)
-        if not hasattr(s, 'descriptors') or not s.descriptors:
+        if not getattr(s, 'descriptors', None):
             s.descriptors = []
         s.descriptors.append(desc)
 
@@ -399,10 +426,7 @@ class _EnumerationMapper(object):
         self._base_class = base_class
         self._other_name = getattr(base_class, attr).upper()
         self._attr = attr
-        self._map = dict(
-            (getattr(x[1], attr).upper(), x[1])
-            for x in inspect.getmembers(module, inspect.isclass)
-            if issubclass(x[1], base_class) and x[1] is not base_class)
+        self._map = _get_subclass_map(module, base_class, attr)
         self._other_map = {}
 
     def get(self, name, other_det):
@@ -416,18 +440,21 @@ class _EnumerationMapper(object):
         # a class for; make and cache a new class for the given name:
         if name != self._other_name:
             class ExtraType(self._base_class):
+                __slots__ = []
                 other_details = None
             setattr(ExtraType, self._attr, name)
             self._map[name] = ExtraType
             return ExtraType
         # If name is "Other" then treat other_details as the key
         other_det_up = other_det if other_det is None else other_det.upper()
-        if other_det_up not in self._other_map:
+        typ = self._other_map.get(other_det_up)
+        if typ is None:
             class CustomType(self._base_class):
+                __slots__ = []
                 other_details = other_det
                 __doc__ = other_det
-            self._other_map[other_det_up] = CustomType
-        return self._other_map[other_det_up]
+            typ = self._other_map[other_det_up] = CustomType
+        return typ
 
 
 class _TargetEntityHandler(Handler):
@@ -476,14 +503,16 @@ class _TargetRefDBHandler(Handler):
         # We start with two distinct lists, as python-ihm uses struct_ref.id
         # as the key, which _ma_target_ref_db_details does not use.
         for e in self.system.entities:
-            ihm_refs = [r for r in e.references
-                        if not isinstance(r,
-                                          modelcif.reference.TargetReference)]
-            ma_refs = [r for r in e.references
-                       if isinstance(r, modelcif.reference.TargetReference)]
+            ihm_refs = []
+            ma_refs = []
+            for r in e.references:
+                if isinstance(r, modelcif.reference.TargetReference):
+                    ma_refs.append(r)
+                else:
+                    ihm_refs.append(r)
             e.references = ma_refs
-            ma_refs = dict(((r.db_name, r.db_code, r.accession), r)
-                           for r in ma_refs)
+            ma_refs = {(r.db_name, r.db_code, r.accession): r
+                       for r in ma_refs}
             for ir in ihm_refs:
                 k = (ir.db_name, ir.db_code, ir.accession)
                 mr = ma_refs.get(k)
@@ -604,30 +633,26 @@ class _TemplateCoordHandler(Handler):
 def _get_align_class(type_class, mode_class, align_class_map):
     """Create and return a new class to represent an alignment"""
     k = (type_class, mode_class)
-    if k not in align_class_map:
+    cls = align_class_map.get(k)
+    if cls is None:
         class Alignment(type_class, mode_class):
             pass
-        align_class_map[k] = Alignment
-    return align_class_map[k]
+        cls = align_class_map[k] = Alignment
+    return cls
 
 
 class _AlignmentInfoHandler(Handler):
     category = '_ma_alignment_info'
 
+    # Map type to subclass of modelcif.alignment.AlignmentType
+    _type_map = _get_subclass_map(
+        modelcif.alignment, modelcif.alignment.AlignmentType, 'type')
+    # Map mode to subclass of modelcif.alignment.AlignmentMode
+    _mode_map = _get_subclass_map(
+        modelcif.alignment, modelcif.alignment.AlignmentMode, 'mode')
+
     def __init__(self, *args):
         super(_AlignmentInfoHandler, self).__init__(*args)
-        # Map type to subclass of modelcif.alignment.AlignmentType
-        self._type_map = dict(
-            (x[1].type.upper(), x[1])
-            for x in inspect.getmembers(modelcif.alignment, inspect.isclass)
-            if issubclass(x[1], modelcif.alignment.AlignmentType)
-            and x[1] is not modelcif.alignment.AlignmentType)
-        # Map mode to subclass of modelcif.alignment.AlignmentMode
-        self._mode_map = dict(
-            (x[1].mode.upper(), x[1])
-            for x in inspect.getmembers(modelcif.alignment, inspect.isclass)
-            if issubclass(x[1], modelcif.alignment.AlignmentMode)
-            and x[1] is not modelcif.alignment.AlignmentMode)
         # Cache created Alignment classes
         self._align_class_map = {}
 
@@ -820,7 +845,10 @@ class _ModelGroupHandler(Handler):
 
     def __call__(self, id, name, details):
         model_group = self.sysr.model_groups.get_by_id(id)
-        self.copy_if_present(model_group, locals(), keys=('name', 'details'))
+        if name is not None:
+            model_group.name = name
+        if details is not None:
+            model_group.details = details
 
 
 class _ModelGroupLinkHandler(Handler):
@@ -835,14 +863,9 @@ class _ModelGroupLinkHandler(Handler):
 class _ProtocolHandler(Handler):
     category = '_ma_protocol_step'
 
-    def __init__(self, *args):
-        super(_ProtocolHandler, self).__init__(*args)
-        # Map method_type to subclass of modelcif.protocol.Step
-        self._method_map = dict(
-            (x[1].method_type.upper(), x[1])
-            for x in inspect.getmembers(modelcif.protocol, inspect.isclass)
-            if issubclass(x[1], modelcif.protocol.Step)
-            and x[1] is not modelcif.protocol.Step)
+    # Map method_type to subclass of modelcif.protocol.Step
+    _method_map = _get_subclass_map(modelcif.protocol, modelcif.protocol.Step,
+                                    'method_type')
 
     def __call__(self, protocol_id, method_type, step_name, details,
                  software_group_id, input_data_group_id, output_data_group_id):
@@ -865,9 +888,8 @@ def _get_assoc_type_maps():
                                            inspect.isclass)
           if issubclass(x[1], modelcif.associated.File)
           and x[1] is not modelcif.associated.File]
-    _type_map = dict(
-        ((x.file_content.upper(), x.file_format.upper()), x)
-        for x in cs if not hasattr(x, '_binary_ff_map'))
+    _type_map = {(x.file_content.upper(), x.file_format.upper()): x
+                 for x in cs if not hasattr(x, '_binary_ff_map')}
     # Do the same thing for classes that take a 'binary' argument
     _bin_type_map = {}
     for x in cs:
@@ -899,10 +921,11 @@ def _get_assoc_class(file_content, file_format, type_map, binary_type_map):
 class _AssociatedHandler(Handler):
     category = '_ma_entry_associated_files'
 
+    _type_map, _binary_type_map = _get_assoc_type_maps()
+
     def __init__(self, *args):
         super(_AssociatedHandler, self).__init__(*args)
         self._repos_by_root = {}
-        self._type_map, self._binary_type_map = _get_assoc_type_maps()
 
     def __call__(self, id, file_url, file_type, file_format, file_content,
                  details, data_id):
@@ -930,9 +953,11 @@ class _AssociatedHandler(Handler):
 class _AssociatedArchiveHandler(Handler):
     category = '_ma_associated_archive_file_details'
 
+    _type_map = _AssociatedHandler._type_map
+    _binary_type_map = _AssociatedHandler._binary_type_map
+
     def __init__(self, *args):
         super(_AssociatedArchiveHandler, self).__init__(*args)
-        self._type_map, self._binary_type_map = _get_assoc_type_maps()
         self._archive_files = collections.defaultdict(list)
 
     def __call__(self, id, archive_file_id, file_path, file_format,
@@ -977,9 +1002,8 @@ class _PolyResidueFeatureHandler(Handler):
     def __call__(self, feature_id, label_seq_id, label_asym_id):
         f = self.sysr.features.get_by_id(
             feature_id, modelcif.PolyResidueFeature)
-        asym = self.sysr.asym_units.get_by_id(label_asym_id)
-        seq_id = self.get_int(label_seq_id)
-        f.residues.append(asym.residue(seq_id))
+        f.residues.append(self.sysr.get_residue(
+            label_asym_id, self.get_int(label_seq_id)))
 
 
 class _EntityInstanceFeatureHandler(Handler):
@@ -995,6 +1019,8 @@ class _EntityInstanceFeatureHandler(Handler):
 def _make_qa_class(type_class, mode_class, p_name, p_description, p_software):
     """Create and return a new class to represent a QA metric"""
     class QA(type_class, mode_class):
+        # Files can contain very many metrics, so don't give each one a dict
+        __slots__ = []
         name = p_name
         __doc__ = p_description
         software = p_software
@@ -1005,14 +1031,12 @@ def _make_qa_class(type_class, mode_class, p_name, p_description, p_software):
 class _QAMetricHandler(Handler):
     category = '_ma_qa_metric'
 
+    # Map mode to subclass of modelcif.qa_metric.MetricMode
+    _mode_map = _get_subclass_map(
+        modelcif.qa_metric, modelcif.qa_metric.MetricMode, 'mode')
+
     def __init__(self, *args):
         super(_QAMetricHandler, self).__init__(*args)
-        # Map mode to subclass of modelcif.qa_metric.MetricMode
-        self._mode_map = dict(
-            (x[1].mode.upper(), x[1])
-            for x in inspect.getmembers(modelcif.qa_metric, inspect.isclass)
-            if issubclass(x[1], modelcif.qa_metric.MetricMode)
-            and x[1] is not modelcif.qa_metric.MetricMode)
         # Map type to subclass of modelcif.qa_metric.MetricType
         # (also allow user-defined "other" classes)
         self._type_map = _EnumerationMapper(
@@ -1044,9 +1068,8 @@ class _QAMetricLocalHandler(Handler):
     def __call__(self, model_id, label_asym_id, label_seq_id, metric_id,
                  metric_value):
         model = self.sysr.models.get_by_id(model_id)
-        asym = self.sysr.asym_units.get_by_id(label_asym_id)
-        seq_id = self.get_int(label_seq_id)
-        residue = asym.residue(seq_id)
+        residue = self.sysr.get_residue(label_asym_id,
+                                        self.get_int(label_seq_id))
         metric_class = self.sysr.qa_by_id[metric_id]
         model.qa_metrics.append(metric_class(residue,
                                              self.get_float(metric_value)))
@@ -1058,12 +1081,10 @@ class _QAMetricPairwiseHandler(Handler):
     def __call__(self, model_id, label_asym_id_1, label_seq_id_1,
                  label_asym_id_2, label_seq_id_2, metric_id, metric_value):
         model = self.sysr.models.get_by_id(model_id)
-        asym1 = self.sysr.asym_units.get_by_id(label_asym_id_1)
-        seq_id1 = self.get_int(label_seq_id_1)
-        residue1 = asym1.residue(seq_id1)
-        asym2 = self.sysr.asym_units.get_by_id(label_asym_id_2)
-        seq_id2 = self.get_int(label_seq_id_2)
-        residue2 = asym2.residue(seq_id2)
+        residue1 = self.sysr.get_residue(label_asym_id_1,
+                                         self.get_int(label_seq_id_1))
+        residue2 = self.sysr.get_residue(label_asym_id_2,
+                                         self.get_int(label_seq_id_2))
         metric_class = self.sysr.qa_by_id[metric_id]
         model.qa_metrics.append(metric_class(residue1, residue2,
                                              self.get_float(metric_value)))
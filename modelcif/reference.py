@@ -82,7 +82,7 @@ class TargetReference(ihm.reference.Sequence):
     def _get_other_details(self):
         if (type(self) is not TargetReference
                 and self.name == TargetReference.name):
-            return self.__doc__.split('\n')[0]
+            return self.__doc__.split('\n', 1)[0]
 
     other_details = property(
         _get_other_details,
@@ -134,7 +134,7 @@ class TemplateReference(object):
     def _get_other_details(self):
         if (type(self) is not TemplateReference
                 and self.name == TemplateReference.name):
-            return self.__doc__.split('\n')[0]
+            return self.__doc__.split('\n', 1)[0]
 
     other_details = property(
         _get_other_details,
@@ -898,6 +898,62 @@ _ma_alignment.sequence
 #
 """)
 
+    def test_alignment_dumper_shared_segment(self):
+        """Test AlignmentDumper with a template segment shared by alignments"""
+        class Alignment(modelcif.alignment.Global,
+                        modelcif.alignment.Pairwise):
+            pass
+
+        system = modelcif.System()
+        tmp_e = modelcif.Entity('ACG')
+        tgt_e = modelcif.Entity('ACE')
+        tgt_e._id = 1
+        system.entities.extend((tmp_e, tgt_e))
+        asym = modelcif.AsymUnit(tgt_e, id='A')
+        asym._id = 'A'
+        system.asym_units.append(asym)
+        tr = modelcif.Transformation.identity()
+        tr._id = 42
+        t = modelcif.Template(tmp_e, asym_id='H', model_num=1,
+                              transformation=tr)
+        t._data_id = 99
+        for data_id in (100, 101):
+            # Each call to segment() with the same parameters returns the
+            # same object, so only a single segment should be written
+            p = modelcif.alignment.Pair(
+                template=t.segment('AC-G', 1, 3),
+                target=asym.segment('ACE-', 1, 3),
+                score=modelcif.alignment.BLASTEValue("1e-15"),
+                identity=modelcif.alignment.ShorterSequenceIdentity(42.))
+            aln = Alignment(name='testaln', pairs=[p])
+            aln._data_id = data_id
+            system.alignments.append(aln)
+        system._before_write()  # populate system.templates
+
+        dumper = modelcif.dumper._AlignmentDumper()
+        dumper.finalize(system)
+        out = _get_dumper_output(dumper, system)
+        self.assertIn("""
+loop_
+_ma_template_poly_segment.id
+_ma_template_poly_segment.template_id
+_ma_template_poly_segment.residue_number_begin
+_ma_template_poly_segment.residue_number_end
+1 1 1 3
+#
+""", out)
+        self.assertIn("""
+loop_
+_ma_target_template_poly_mapping.id
+_ma_target_template_poly_mapping.template_segment_id
+_ma_target_template_poly_mapping.target_asym_id
+_ma_target_template_poly_mapping.target_seq_id_begin
+_ma_target_template_poly_mapping.target_seq_id_end
+1 1 A 1 3
+2 1 A 1 3
+#
+""", out)
+
     def test_non_poly_template_unused(self):
         """Test AlignmentDumper with unused nonpolymeric template"""
         system = modelcif.System()
@@ -1234,6 +1290,69 @@ _ma_associated_archive_file_details.data_id
         self.assertIn('_audit_conform.dict_name', assoc_file)
         self.assertNotIn('_audit_conform.dict_name', main_file)
 
+    def test_write_associated_duplicate(self):
+        """Test write() function with a File in multiple repositories"""
+        s = modelcif.System(id='system1')
+
+        f = modelcif.associated.CIFFile(
+            path='test_write_associated_duplicate.cif',
+            categories=['struct'],
+            entry_details='test details', entry_id='testcif')
+        for url_root in ('https://example.com', 'https://mirror.com'):
+            s.repositories.append(modelcif.associated.Repository(
+                url_root=url_root, files=[f]))
+
+        # Record the names of all files opened for writing
+        opened = []
+
+        class RecordingWriter(ihm.format.CifWriter):
+            def __init__(self, fh):
+                opened.append(getattr(fh, 'name', None))
+                super(RecordingWriter, self).__init__(fh)
+
+        fh = StringIO()
+        orig_writer = ihm.format.CifWriter
+        ihm.format.CifWriter = RecordingWriter
+        try:
+            modelcif.dumper.write(fh, [s])
+        finally:
+            ihm.format.CifWriter = orig_writer
+        main_file = fh.getvalue()
+        with open('test_write_associated_duplicate.cif') as fh:
+            assoc_file = fh.read()
+        os.unlink('test_write_associated_duplicate.cif')
+        # File should be opened and written only once
+        self.assertEqual(opened.count('test_write_associated_duplicate.cif'),
+                         1)
+        self.assertIn('_struct.title', assoc_file)
+        self.assertNotIn('_struct.title', main_file)
+
+    def test_write_invalidates_cache(self):
+        """Test that write() does not leave stale cached data"""
+        s = modelcif.System(id='system1')
+        m1 = modelcif.model.HomologyModel(assembly=[])
+        mg = modelcif.model.ModelGroup([m1])
+        s.model_groups.append(mg)
+        modelcif.dumper.write(StringIO(), [s])
+        m2 = modelcif.model.HomologyModel(assembly=[])
+        mg.append(m2)
+        self.assertEqual([m for g, m in s._all_models()], [m1, m2])
+
+        # Cache should also be discarded if systems is a generator
+        modelcif.dumper.write(StringIO(), (x for x in [s]))
+        self.assertIsNone(s._cache)
+        m3 = modelcif.model.HomologyModel(assembly=[])
+        mg.append(m3)
+        self.assertEqual([m for g, m in s._all_models()], [m1, m2, m3])
+
+        # ... or if python-ihm's write function is used directly
+        ihm.dumper.write(StringIO(), [s],
+                         variant=modelcif.dumper.ModelCIFVariant)
+        self.assertIsNone(s._cache)
+        m4 = modelcif.model.HomologyModel(assembly=[])
+        mg.append(m4)
+        self.assertEqual([m for g, m in s._all_models()], [m1, m2, m3, m4])
+
     def test_write_associated_in_zip(self):
         """Test write() function with associated files in a ZipFile"""
         s = modelcif.System(id='system1')
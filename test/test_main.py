@@ -8,6 +8,7 @@ import modelcif
 import modelcif.protocol
 import modelcif.descriptor
 import modelcif.associated
+import modelcif.model
 import ihm
 
 
@@ -178,6 +179,19 @@ class Tests(unittest.TestCase):
         # List may contain duplicates
         self.assertEqual(list(alls), [s1, s2, s1, s3])
 
+    def test_all_chem_comps(self):
+        """Test _all_chem_comps() method"""
+        s = modelcif.System()
+        e1 = modelcif.Entity("DMD")
+        s.entities.append(e1)
+        e2 = modelcif.Entity("AD")
+        t1 = modelcif.Template(e2, asym_id='A', model_num=1,
+                               transformation=None)
+        s.templates.append(t1)
+        # Should include template entities, with no duplicates, sorted by ID
+        self.assertEqual([c.id for c in s._all_chem_comps()],
+                         ['ALA', 'ASP', 'MET'])
+
     def test_software_parameter(self):
         """Test SoftwareParameter class"""
         p = modelcif.SoftwareParameter(name='foo', value=42)
@@ -211,6 +225,19 @@ class Tests(unittest.TestCase):
         self.assertEqual(t1.seq_id_range, (1, 4))
         self.assertEqual(t1.template, t1)
 
+    def test_template_segment(self):
+        """Test Template.segment() method"""
+        e1 = modelcif.Entity("DDDD")
+        t1 = modelcif.Template(e1, asym_id='A', model_num=1,
+                               transformation=None)
+        s1 = t1.segment('D-DD', 1, 3)
+        self.assertIs(s1.template, t1)
+        self.assertEqual(s1.gapped_sequence, 'D-DD')
+        self.assertEqual(s1.seq_id_range, (1, 3))
+        # Same parameters should give the same object
+        self.assertIs(t1.segment('D-DD', 1, 3), s1)
+        self.assertIsNot(t1.segment('DD', 1, 2), s1)
+
     def test_software_group_parameters(self):
         """Test old-style SoftwareGroup construction with parameters"""
         s = modelcif.Software(
@@ -225,6 +252,35 @@ class Tests(unittest.TestCase):
         f = modelcif.Feature()
         self.assertIs(f._get_entity_type(), ihm.unknown)
 
+    def test_remove_identical(self):
+        """Test _remove_identical() function"""
+        e1 = modelcif.Entity("D")
+        e2 = modelcif.Entity("D")
+        # Objects that are equal but not identical should be kept
+        self.assertEqual(
+            [id(x) for x in modelcif._remove_identical([e1, e2, e1])],
+            [id(e1), id(e2)])
+
+    def test_all_models_cache(self):
+        """Test caching of _all_models() results"""
+        s = modelcif.System()
+        m1 = modelcif.model.Model(assembly=[])
+        mg = modelcif.model.ModelGroup([m1])
+        s.model_groups.append(mg)
+        # No caching outside of writes
+        self.assertEqual([m for g, m in s._all_models()], [m1])
+        m2 = modelcif.model.Model(assembly=[])
+        mg.append(m2)
+        self.assertEqual([m for g, m in s._all_models()], [m1, m2])
+        # Results are cached once writing starts
+        s._before_write()
+        self.assertEqual([m for g, m in s._all_models()], [m1, m2])
+        m3 = modelcif.model.Model(assembly=[])
+        mg.append(m3)
+        self.assertEqual([m for g, m in s._all_models()], [m1, m2])
+        s._invalidate_cache()
+        self.assertEqual([m for g, m in s._all_models()], [m1, m2, m3])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -46,6 +46,29 @@ class Tests(unittest.TestCase):
         self.assertEqual(x.type, "enum")
         self.assertIsNone(x.other_details)
 
+    def test_slots(self):
+        """Test metric subclasses using __slots__"""
+        class Custom(modelcif.qa_metric.Local, modelcif.qa_metric.PLDDT):
+            """Custom"""
+            __slots__ = []
+        x = Custom('residue', 42)
+        self.assertEqual(x.value, 42)
+        # Per-instance attributes such as software can still be set
+        x.software = 'foo'
+        self.assertEqual(x.software, 'foo')
+
+        # Subclasses that don't use __slots__ should still work
+        class Custom2(modelcif.qa_metric.Local, modelcif.qa_metric.PLDDT):
+            """Custom 2"""
+        x = Custom2('residue', 42)
+        x.foo = 'bar'
+        self.assertEqual(x.foo, 'bar')
+
+        # Software can be set on the base metric classes too
+        x = modelcif.qa_metric.Global(1.0)
+        x.software = 'foo'
+        self.assertEqual(x.software, 'foo')
+
     def test_global_metric(self):
         """Test Global MetricMode"""
         class MyScore(modelcif.qa_metric.Global, modelcif.qa_metric.Energy):
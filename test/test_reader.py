@@ -1078,6 +1078,9 @@ _ma_qa_metric_local.metric_value
         self.assertEqual(q1.residue.asym._id, 'A')
         self.assertEqual(q1.residue.seq_id, 2)
         self.assertAlmostEqual(q1.value, 1.0, delta=1e-6)
+        # Software can be assigned to an individual read metric
+        q1.software = 'foo'
+        self.assertEqual(q1.software, 'foo')
 
     def test_qa_metric_pairwise_handler(self):
         """Test _QAMetricPairwiseHandler"""
@@ -1116,11 +1119,15 @@ _ma_qa_metric_local_pairwise.label_comp_id_2
 _ma_qa_metric_local_pairwise.metric_id
 _ma_qa_metric_local_pairwise.metric_value
 1 1 A 2 CYS B 4 GLY 1 1.0
+2 1 B 4 GLY A 2 CYS 1 0.5
 """
         s, = modelcif.reader.read(StringIO(cif))
         mg, = s.model_groups
         m, = mg
-        q1, = m.qa_metrics
+        q1, q2 = m.qa_metrics
+        # Residue objects should be shared between metrics
+        self.assertIs(q1.residue1, q2.residue2)
+        self.assertIs(q1.residue2, q2.residue1)
         self.assertIsInstance(q1, modelcif.qa_metric.LocalPairwise)
         self.assertIsInstance(q1, modelcif.qa_metric.NormalizedScore)
         self.assertEqual(q1.type, "normalized score")